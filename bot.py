@@ -11,9 +11,12 @@ import aiohttp
 import telethon as tg
 import toml
 
+import cache
 import command
 import module
 import modules
+import scheduler
+import timeline
 import util
 
 
@@ -25,17 +28,20 @@ class Listener:
 
 
 class Bot:
-    def __init__(self, config, config_path):
+    def __init__(self, config, config_path, startup=None):
         self.commands = {}
         self.modules = {}
         self.listeners = {}
 
         self.log = logging.getLogger("bot")
+        self.startup = startup if startup is not None else timeline.Timeline()
         # self.client = tg.TelegramClient("anon", config["telegram"]["api_id"], config["telegram"]["api_hash"])
 
         self.client = tg.TelegramClient("bot", config["telegram"]["api_id"], config["telegram"]["api_hash"])
+        self.entities = cache.EntityCache(self.client)
 
         self.http_session = aiohttp.ClientSession()
+        self.scheduler = scheduler.Scheduler(self)
 
         self.config = config
         self.config_path = config_path
@@ -51,7 +57,7 @@ class Bot:
             raise module.ExistingCommandError(orig, info)
 
         self.commands[name] = info
-        print(f"Registering : {name}")
+        self.log.info(f"Registering : {name}")
 
         for alias in getattr(func, "aliases", []):
             if alias in self.commands:
@@ -132,9 +138,12 @@ class Bot:
             old = self.modules[cls.name].__class__
             raise module.ExistingModuleError(old, cls)
 
-        mod = cls(self)
+        with self.startup.phase(f"construct {cls.name}"):
+            mod = cls(self)
+
         self.register_listeners(mod)
         self.register_commands(mod)
+        self.scheduler.register_jobs(mod)
         self.modules[cls.name] = mod
 
     def unload_module(self, mod):
@@ -143,6 +152,7 @@ class Bot:
 
         self.unregister_listeners(mod)
         self.unregister_commands(mod)
+        self.scheduler.unregister_jobs(mod)
         del self.modules[cls.name]
 
     def load_all_modules(self):
@@ -191,12 +201,9 @@ class Bot:
         self.last_saved_cfg = data
 
     async def writer(self):
-        while True:
-            await asyncio.sleep(15)
-
-            cfg = toml.dumps(self.config)
-            if cfg != self.last_saved_cfg:
-                await self.save_config(data=cfg)
+        cfg = toml.dumps(self.config)
+        if cfg != self.last_saved_cfg:
+            await self.save_config(data=cfg)
 
     def command_predicate(self, event):
         if event.raw_text.startswith(self.prefix):
@@ -215,16 +222,36 @@ class Bot:
         # Get and store current event loop, since this is the first coroutine
         self.loop = asyncio.get_event_loop()
 
-        # Load modules and save config in case any migration changes were made
-        self.load_all_modules()
-        await self.dispatch_event("load")
-        await self.save_config()
+        # Start Telegram client while modules load; event handlers aren't registered until later
+        connect = self.loop.create_task(
+            self.startup.measure("connect client", self.client.start(bot_token=config["telegram"]["bot_key"]))
+        )
 
-        # Start Telegram client
-        await self.client.start(bot_token=config["telegram"]["bot_key"])
+        try:
+            # Let the client get as far as its first network I/O before we block on module construction
+            await asyncio.sleep(0)
+
+            # Load modules and save config only if any migration changes were made
+            self.load_all_modules()
+            await self.dispatch_event("load")
+
+            with self.startup.phase("initial save"):
+                await self.writer()
+        except:
+            connect.cancel()
+            try:
+                await connect
+            except (asyncio.CancelledError, Exception):
+                # The loading error is the one worth reporting
+                pass
+
+            raise
+
+        await connect
 
         # Get info
-        self.user = await self.client.get_me()
+        with self.startup.phase("get self"):
+            self.user = await self.client.get_me()
         self.uid = self.user.id
 
         self.log.info(f"User is @{self.user.username}")
@@ -250,6 +277,7 @@ class Bot:
         # Record start time and dispatch start event
         self.start_time_us = util.time_us()
         await self.dispatch_event("start", self.start_time_us)
+        self.startup.finish()
 
         # Register handlers
         self.client.add_event_handler(self.on_message, tg.events.NewMessage)
@@ -257,8 +285,9 @@ class Bot:
         self.client.add_event_handler(self.on_command, tg.events.NewMessage(outgoing=False, func=self.command_predicate))
         self.client.add_event_handler(self.on_chat_action, tg.events.ChatAction)
 
-        # Save config in the background
-        self.loop.create_task(self.writer())
+        # Start scheduler and save config in the background
+        self.scheduler.add(scheduler.Job("Bot.writer", self.writer, None, scheduler.Interval(15)))
+        self.scheduler.start()
 
         self.log.info("Bot is ready")
 
@@ -268,10 +297,11 @@ class Bot:
         self.log.info("Finished catching up")
 
         # Save config to sync updated stats after catching up
-        await self.save_config()
+        await self.writer()
 
     async def stop(self):
         await self.dispatch_event("stop")
+        self.scheduler.stop()
         await self.save_config()
         await self.http_session.close()
 
@@ -284,7 +314,11 @@ class Bot:
             return None
 
         for l in listeners:
-            task = self.loop.create_task(l.func(*args))
+            coro = l.func(*args)
+            if self.startup.recording:
+                coro = self.startup.measure(f"on_{event} {l.module.name}", coro)
+
+            task = self.loop.create_task(coro)
             tasks.add(task)
 
         return await asyncio.wait(tasks)
@@ -293,12 +327,15 @@ class Bot:
         return self.loop.create_task(self.dispatch_event(*args, **kwargs))
 
     async def on_message(self, event):
+        self.entities.feed_event(event)
         await self.dispatch_event("message", event)
 
     async def on_message_edit(self, event):
+        self.entities.feed_event(event)
         await self.dispatch_event("message_edit", event)
 
     async def on_chat_action(self, event):
+        self.entities.feed_chat_action(event)
         await self.dispatch_event("chat_action", event)
 
     async def on_command(self, event):
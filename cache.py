@@ -0,0 +1,127 @@
+import logging
+import time
+from collections import OrderedDict
+
+import telethon as tg
+
+
+class EntityCache:
+    def __init__(self, client, maxsize=4096, ttl=3600):
+        self.client = client
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.log = logging.getLogger("cache")
+
+        # Peer ID -> (expiry time, entity), kept in least to most recently used order
+        self.entries = OrderedDict()
+
+    def put(self, entity):
+        if entity is None:
+            return
+
+        try:
+            peer_id = tg.utils.get_peer_id(entity)
+        except TypeError:
+            return
+
+        self.entries[peer_id] = (time.monotonic() + self.ttl, entity)
+        self.entries.move_to_end(peer_id)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, peer_id):
+        try:
+            expiry, entity = self.entries[peer_id]
+        except KeyError:
+            return None
+
+        if expiry < time.monotonic():
+            del self.entries[peer_id]
+            return None
+
+        self.entries.move_to_end(peer_id)
+        return entity
+
+    def invalidate(self, *peer_ids):
+        for peer_id in peer_ids:
+            self.entries.pop(peer_id, None)
+
+    def feed_event(self, event):
+        # Telethon attaches every entity referenced by an update, so no requests are needed here.
+        # These are private attributes of Telethon 1.14 (pinned in requirements.txt); re-check them on upgrade.
+        for entity in getattr(event, "_entities", {}).values():
+            self.put(entity)
+
+        msg = getattr(event, "message", None)
+        self.put(getattr(msg, "_sender", None))
+        self.put(getattr(msg, "_chat", None))
+
+    def feed_chat_action(self, event):
+        # Chat titles, photos and memberships may have changed
+        self.invalidate(event.chat_id, *(event.user_ids or ()))
+        self.feed_event(event)
+
+    def input_peer(self, peer_id, kind):
+        # Use the access hash from the session if we have one; bots may pass 0 for users they've seen
+        try:
+            peer = self.client.session.get_input_entity(peer_id)
+        except ValueError:
+            peer = None
+
+        if kind == tg.types.PeerUser:
+            try:
+                return tg.utils.get_input_user(peer)
+            except TypeError:
+                return tg.types.InputUser(tg.utils.resolve_id(peer_id)[0], 0)
+        else:
+            try:
+                return tg.utils.get_input_channel(peer)
+            except TypeError:
+                return tg.types.InputChannel(tg.utils.resolve_id(peer_id)[0], 0)
+
+    async def fetch(self, name, request):
+        try:
+            result = await self.client(request)
+        except tg.errors.RPCError as e:
+            self.log.warning(f"Unable to resolve {name}: {e}")
+            return []
+
+        # GetUsersRequest returns a plain list, the others a messages.Chats container
+        entities = getattr(result, "chats", result)
+        return [e for e in entities if not isinstance(e, (tg.types.UserEmpty, tg.types.ChatEmpty))]
+
+    async def resolve(self, peer_ids):
+        results = {}
+        users = []
+        chats = []
+        channels = []
+
+        for peer_id in dict.fromkeys(peer_ids):
+            entity = self.get(peer_id)
+            if entity is not None:
+                results[peer_id] = entity
+                continue
+
+            real_id, kind = tg.utils.resolve_id(peer_id)
+            if kind == tg.types.PeerUser:
+                users.append(self.input_peer(peer_id, kind))
+            elif kind == tg.types.PeerChat:
+                chats.append(real_id)
+            else:
+                channels.append(self.input_peer(peer_id, kind))
+
+        # client.get_entity sends a request per unknown ID, so batch the misses into one request per peer type
+        entities = []
+        if users:
+            entities += await self.fetch("users", tg.functions.users.GetUsersRequest(users))
+        if chats:
+            entities += await self.fetch("chats", tg.functions.messages.GetChatsRequest(chats))
+        if channels:
+            entities += await self.fetch("channels", tg.functions.channels.GetChannelsRequest(channels))
+
+        for entity in entities:
+            self.put(entity)
+            results[tg.utils.get_peer_id(entity)] = entity
+
+        return results
@@ -1,24 +1,172 @@
 import asyncio
+import copy
+import importlib
+import importlib.util
+import json
 import logging
+import logging.handlers
+import pkgutil
+import queue
+import sys
+import threading
+import time
 
 import colorlog
 import toml
 import uvloop
 
-import util
-from bot import Bot
+import timeline
 
 # Copied from pyrobud
 
 LOG_LEVEL = logging.INFO
 LOG_FORMAT = "  %(log_color)s%(levelname)-8s%(reset)s | %(name)-7s | %(log_color)s%(message)s%(reset)s"
 
+# Defaults for the [logging] config section
+LOG_QUEUED = True
+LOG_JSON = False
+LOG_QUEUE_SIZE = 10000
+LOG_RATE_LIMIT = ["bot"]
+LOG_RATE_LIMIT_LEVEL = "ERROR"
+LOG_RATE_LIMIT_BURST = 10
+LOG_RATE_LIMIT_PERIOD = 60
+
+# Heavy packages imported up front so startup profiling can attribute import time to each one
+STARTUP_IMPORTS = ["telethon", "aiohttp", "aiofiles", "command", "module", "util", "modules", "bot"]
+
 log = logging.getLogger("wrapper")
 
 
-def setup_logging():
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, names, burst, period, level=logging.WARNING):
+        super().__init__()
+
+        self.names = names
+        self.burst = burst
+        self.period = period
+        self.level = level
+        self.handler = None
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def limited(self, record):
+        if record.levelno < self.level:
+            return False
+
+        return any(record.name == name or record.name.startswith(name + ".") for name in self.names)
+
+    def filter(self, record):
+        if getattr(record, "rate_limit_summary", False) or not self.limited(record):
+            return True
+
+        # Report windows that closed while their call site was quiet; shutdown flushes the rest
+        self.flush()
+
+        # Messages are usually f-strings, so group them by call site instead of text
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+
+        with self.lock:
+            start, count, suppressed = self.windows.get(key, (now, 0, 0))
+            if count >= self.burst:
+                self.windows[key] = (start, count, suppressed + 1)
+                return False
+
+            self.windows[key] = (start, count + 1, suppressed)
+            return True
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        closed = []
+
+        with self.lock:
+            # Can't delete while iterating, so collect a list first
+            for key, (start, _, suppressed) in list(self.windows.items()):
+                if force or now - start >= self.period:
+                    del self.windows[key]
+                    if suppressed:
+                        closed.append((key, suppressed))
+
+        # Emit outside the lock since the summaries come back through this filter
+        for (name, pathname, lineno), suppressed in closed:
+            record = logging.LogRecord(
+                name, logging.WARNING, pathname, lineno, f"Suppressed {suppressed} similar messages", None, None
+            )
+            record.rate_limit_summary = True
+            self.handler.handle(record)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self.pending_drops = 0
+
+    def prepare(self, record):
+        # Freeze the message now since args may be mutated later, but leave formatting to the listener thread.
+        # Unlike the stdlib version, exc_info is kept so the traceback is also formatted there.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.pending_drops:
+                self.queue.put_nowait(self.drop_record())
+                self.pending_drops = 0
+
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.pending_drops += 1
+
+    def flush_drops(self):
+        # Called on shutdown while the listener is still draining, so blocking is fine
+        if self.pending_drops:
+            self.queue.put(self.drop_record())
+            self.pending_drops = 0
+
+    def drop_record(self):
+        return logging.LogRecord(
+            log.name,
+            logging.WARNING,
+            __file__,
+            0,
+            f"Dropped {self.pending_drops} log records (queue full, {self.dropped} in total)",
+            None,
+            None,
+        )
+
+
+class BlockingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # The stdlib uses put_nowait, which raises if the bounded queue is full at shutdown
+        self.queue.put(self._sentinel)
+
+
+def setup_logging(config):
     logging.root.setLevel(LOG_LEVEL)
-    formatter = colorlog.ColoredFormatter(LOG_FORMAT)
+
+    if config.get("json", LOG_JSON):
+        formatter = JSONFormatter()
+    else:
+        formatter = colorlog.ColoredFormatter(LOG_FORMAT)
 
     stream = logging.StreamHandler()
     stream.setLevel(LOG_LEVEL)
@@ -26,28 +174,117 @@ def setup_logging():
 
     root = logging.getLogger()
     root.setLevel(LOG_LEVEL)
-    root.addHandler(stream)
+
+    # Replace the handler from an earlier call (the bootstrap setup in main)
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+
+    if config.get("queued", LOG_QUEUED):
+        # Format and write records on a background thread so slow stdout doesn't stall the event loop
+        handler = BoundedQueueHandler(config.get("queue_size", LOG_QUEUE_SIZE))
+        listener = BlockingQueueListener(handler.queue, stream, respect_handler_level=True)
+        listener.start()
+    else:
+        handler = stream
+        listener = None
+
+    # Rate limit repetitive per-message errors; set rate_limit = [] to disable
+    rate_limit = None
+    names = config.get("rate_limit", LOG_RATE_LIMIT)
+    if names:
+        rate_limit = RateLimitFilter(
+            names,
+            config.get("rate_limit_burst", LOG_RATE_LIMIT_BURST),
+            config.get("rate_limit_period", LOG_RATE_LIMIT_PERIOD),
+            level=logging.getLevelName(config.get("rate_limit_level", LOG_RATE_LIMIT_LEVEL)),
+        )
+        rate_limit.handler = handler
+        handler.addFilter(rate_limit)
+
+    root.addHandler(handler)
+
+    def stop_logging():
+        if rate_limit is not None:
+            rate_limit.flush(force=True)
+
+        if listener is not None:
+            handler.flush_drops()
+            listener.stop()
+
+    return stop_logging
+
+
+def import_module_pkg(startup):
+    # modules/__init__.py imports every submodule at once, so set up the package without running it,
+    # import each submodule as its own phase, and only then run the package body
+    spec = importlib.util.find_spec("modules")
+    pkg = importlib.util.module_from_spec(spec)
+    sys.modules["modules"] = pkg
+
+    try:
+        for _, name, _ in pkgutil.iter_modules(spec.submodule_search_locations):
+            with startup.phase(f"import modules.{name}"):
+                importlib.import_module(f"modules.{name}")
+
+        with startup.phase("import modules"):
+            spec.loader.exec_module(pkg)
+    except:
+        # Can't leave a half-initialized package behind
+        for name in [name for name in sys.modules if name == "modules" or name.startswith("modules.")]:
+            del sys.modules[name]
+
+        raise
+
+
+def import_packages(startup):
+    for name in STARTUP_IMPORTS:
+        if name == "modules":
+            import_module_pkg(startup)
+            continue
+
+        with startup.phase(f"import {name}"):
+            importlib.import_module(name)
 
 
 def main():
     config_path = "config.toml"
+    startup = timeline.Timeline()
+
+    # Log synchronously with the default format until the [logging] section is known
+    setup_logging({"queued": False})
 
-    setup_logging()
+    import_packages(startup)
+    from bot import Bot
 
     log.info("Loading config")
-    config = toml.load(config_path)
+    with startup.phase("parse config"):
+        config = toml.load(config_path)
+
+    stop_logging = setup_logging(config.get("logging", {}))
+
+    try:
+        log.info("Initializing bot")
+        with startup.phase("initialize bot"):
+            bot = Bot(config, config_path, startup=startup)
 
-    log.info("Initializing bot")
-    bot = Bot(config, config_path)
+        log.info("Starting bot")
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(bot.start(config))
 
-    log.info("Starting bot")
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(bot.start(config))
+        # Set a path in [bot] startup_profile to log the startup timeline and export it as JSON
+        profile_path = config["bot"].get("startup_profile")
+        if profile_path:
+            startup.log(log)
+            startup.export(profile_path)
+            log.info(f"Exported startup profile to '{profile_path}'")
 
-    bot.client.run_until_disconnected()
+        bot.client.run_until_disconnected()
 
-    log.info("Stopping bot")
-    loop.run_until_complete(bot.stop())
+        log.info("Stopping bot")
+        loop.run_until_complete(bot.stop())
+    finally:
+        # Flush queued records even if startup fails or we're interrupted
+        stop_logging()
 
 
 if __name__ == "__main__":
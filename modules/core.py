@@ -39,3 +39,27 @@ class CoreModule(module.Module):
     async def cmd_uptime(self, msg):
         delta_us = util.time_us() - self.bot.start_time_us
         return f"Uptime: {util.format_duration_us(delta_us)}"
+
+    @command.desc("List scheduled jobs and their run-times")
+    async def cmd_jobs(self, msg):
+        if not util.check_user_admin(msg.from_id):
+            return
+
+        if not self.bot.scheduler.jobs:
+            return "__No jobs scheduled.__"
+
+        lines = []
+        now_us = util.time_us()
+
+        for name, job in self.bot.scheduler.jobs.items():
+            next_str = util.format_duration_us(max(0, job.next_run * 1000000 - now_us))
+
+            if job.runs:
+                avg_us = job.total_duration_us / job.runs
+                time_str = f"last {util.format_duration_us(job.last_duration_us)}, avg {util.format_duration_us(avg_us)}"
+            else:
+                time_str = "never run"
+
+            lines.append(f"**{name}** ({job.trigger}): next in {next_str}, {job.runs} runs ({time_str})")
+
+        return "\n".join(lines)
@@ -0,0 +1,338 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import toml
+
+import util
+
+
+class Interval:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def next_after(self, last, now):
+        if last is None:
+            return now + self.seconds
+
+        # Coalesce missed runs into a single one while keeping the original phase
+        missed = max(0, int((now - last) // self.seconds))
+        return last + (missed + 1) * self.seconds
+
+    def __str__(self):
+        return f"every {util.format_duration_us(self.seconds * 1000000)}"
+
+
+class Cron:
+    def __init__(self, minute=None, hour=None, day=None, month=None, weekday=None):
+        self.minute = self._field(minute)
+        self.hour = self._field(hour)
+        self.day = self._field(day)
+        self.month = self._field(month)
+        self.weekday = self._field(weekday)
+
+    @staticmethod
+    def _field(value):
+        if value is None:
+            return None
+        elif isinstance(value, int):
+            return {value}
+        else:
+            return set(value)
+
+    @staticmethod
+    def _match(field, value):
+        return field is None or value in field
+
+    def _match_day(self, t):
+        # Like cron: Sunday is weekday 0, and if both day and weekday are restricted either one may match
+        weekday = (t.weekday() + 1) % 7
+
+        if self.day is not None and self.weekday is not None:
+            return t.day in self.day or weekday in self.weekday
+
+        return self._match(self.day, t.day) and self._match(self.weekday, weekday)
+
+    def next_after(self, last, now):
+        # Missed runs are coalesced by always searching forward from now
+        t = datetime.fromtimestamp(now).replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        # Skip whole months/days/hours at a time so we never walk minute by minute over a year
+        for _ in range(5000):
+            if not self._match(self.month, t.month):
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._match_day(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif not self._match(self.hour, t.hour):
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif not self._match(self.minute, t.minute):
+                t += timedelta(minutes=1)
+            else:
+                return t.timestamp()
+
+        return None
+
+    def __str__(self):
+        fields = (self.minute, self.hour, self.day, self.month, self.weekday)
+        return "cron " + " ".join("*" if f is None else ",".join(map(str, sorted(f))) for f in fields)
+
+
+class At:
+    def __init__(self, when):
+        if isinstance(when, datetime):
+            when = when.timestamp()
+
+        self.when = when
+
+    def next_after(self, last, now):
+        # One-shot: fire once, even if the time has already passed
+        if last is None:
+            return self.when
+
+        return None
+
+    def __str__(self):
+        return f"at {datetime.fromtimestamp(self.when):%Y-%m-%d %H:%M:%S}"
+
+
+def _schedule_decorator(trigger, jitter):
+    def schedule_decorator(func):
+        func.trigger = trigger
+        func.jitter = jitter
+        return func
+
+    return schedule_decorator
+
+
+def interval(seconds, jitter=0):
+    return _schedule_decorator(Interval(seconds), jitter)
+
+
+def cron(minute=None, hour=None, day=None, month=None, weekday=None, jitter=0):
+    # Fields follow crontab(5): weekday 0 is Sunday, and day/weekday are ORed when both are given
+    return _schedule_decorator(Cron(minute, hour, day, month, weekday), jitter)
+
+
+def at(when, jitter=0):
+    return _schedule_decorator(At(when), jitter)
+
+
+class Job:
+    def __init__(self, name, func, module, trigger, jitter=0, args=(), persist_id=None):
+        self.name = name
+        self.func = func
+        self.module = module
+        self.trigger = trigger
+        self.jitter = jitter
+        self.args = args
+        self.persist_id = persist_id
+
+        self.base_time = None
+        self.next_run = None
+        self.cancelled = False
+
+        self.runs = 0
+        self.last_run = None
+        self.last_duration_us = None
+        self.total_duration_us = 0
+
+
+class Scheduler:
+    def __init__(self, bot):
+        self.bot = bot
+        self.jobs = {}
+        self.log = logging.getLogger("scheduler")
+
+        # Min-heap of (run time, sequence, job); cancelled or rescheduled entries are skipped lazily
+        self.queue = []
+        self.seq = itertools.count()
+        self.wakeup = None
+        self.task = None
+
+    @property
+    def persisted(self):
+        # Only read here; run_at creates the section so an idle scheduler never dirties the config
+        return self.bot.config.get("scheduler", {}).get("jobs", {})
+
+    def push(self, job, now=None):
+        if now is None:
+            now = time.time()
+
+        base = job.trigger.next_after(job.base_time, now)
+        if base is None:
+            self.cancel(job)
+            return
+
+        job.base_time = base
+        job.next_run = base + random.uniform(0, job.jitter) if job.jitter else base
+        heapq.heappush(self.queue, (job.next_run, next(self.seq), job))
+
+        # Wake up the runner if this job is now first in line
+        if self.wakeup is not None and self.queue[0][2] is job:
+            self.wakeup.set()
+
+    def add(self, job):
+        if job.name in self.jobs:
+            raise KeyError(f"Job '{job.name}' already exists")
+
+        self.jobs[job.name] = job
+        self.push(job)
+        return job
+
+    def remove(self, job):
+        job.cancelled = True
+        self.jobs.pop(job.name, None)
+
+    def cancel(self, job):
+        self.remove(job)
+
+        if job.persist_id is not None:
+            self.persisted.pop(job.persist_id, None)
+
+    def register_jobs(self, mod):
+        for sym in dir(mod):
+            func = getattr(mod, sym)
+            trigger = getattr(func, "trigger", None)
+            if not callable(func) or trigger is None:
+                continue
+
+            name = f"{mod.name}.{sym}"
+            if isinstance(trigger, At) and trigger.when < time.time():
+                self.log.warning(f"Skipping one-shot job '{name}' scheduled in the past")
+                continue
+
+            self.add(Job(name, func, mod, trigger, jitter=func.jitter))
+
+        self.restore_jobs(mod)
+
+    def unregister_jobs(self, mod):
+        # Persisted jobs stay in the config so they come back when the module is loaded again
+        # Can't remove while iterating, so collect a list first
+        for job in [job for job in self.jobs.values() if job.module == mod]:
+            self.remove(job)
+
+    @staticmethod
+    def _toml_value(value):
+        # Tuples are stored as TOML arrays and come back as lists
+        if isinstance(value, (list, tuple)):
+            return [Scheduler._toml_value(v) for v in value]
+        elif isinstance(value, dict):
+            return {k: Scheduler._toml_value(v) for k, v in value.items()}
+        else:
+            return value
+
+    def check_persistable(self, name, args):
+        # toml silently stringifies values it can't encode, so make sure the args survive a round trip
+        args = self._toml_value(args)
+
+        try:
+            restored = toml.loads(toml.dumps({"args": args})).get("args", [])
+        except toml.TomlDecodeError as e:
+            raise TypeError(f"Arguments for persisted job '{name}' must be TOML-serializable: {e}") from e
+
+        if restored != args:
+            raise TypeError(f"Arguments for persisted job '{name}' must be TOML-serializable")
+
+        return args
+
+    def run_at(self, mod, func_name, when, *args, jitter=0, persist=True):
+        if persist:
+            args = self.check_persistable(f"{mod.name}.{func_name}", args)
+
+        persist_id = uuid.uuid4().hex if persist else None
+        name = f"{mod.name}.{func_name}@{persist_id or next(self.seq)}"
+        job = Job(name, getattr(mod, func_name), mod, At(when), jitter=jitter, args=args, persist_id=persist_id)
+
+        if persist:
+            persisted = self.bot.config.setdefault("scheduler", {}).setdefault("jobs", {})
+            persisted[persist_id] = {
+                "module": mod.name,
+                "func": func_name,
+                "time": job.trigger.when,
+                "args": args,
+                "jitter": jitter,
+            }
+
+        return self.add(job)
+
+    def restore_jobs(self, mod):
+        # Can't remove while iterating, so collect a list first
+        for persist_id, info in list(self.persisted.items()):
+            if info["module"] != mod.name:
+                continue
+
+            name = f"{mod.name}.{info['func']}@{persist_id}"
+            if name in self.jobs:
+                continue
+
+            try:
+                func = getattr(mod, info["func"])
+            except AttributeError:
+                self.log.warning(f"Dropping persisted job '{name}': function no longer exists")
+                del self.persisted[persist_id]
+                continue
+
+            args = tuple(info.get("args", ()))
+            jitter = info.get("jitter", 0)
+            self.add(Job(name, func, mod, At(info["time"]), jitter=jitter, args=args, persist_id=persist_id))
+
+    def prune_jobs(self):
+        # Can't remove while iterating, so collect a list first
+        for persist_id, info in list(self.persisted.items()):
+            if info["module"] not in self.bot.modules:
+                self.log.warning(f"Dropping persisted job '{info['module']}.{info['func']}': module no longer exists")
+                del self.persisted[persist_id]
+
+    async def run_job(self, job):
+        # Jobs are only pushed back onto the queue once they finish, so runs of one job never overlap
+        before = util.time_us()
+
+        try:
+            await job.func(*job.args)
+        except Exception as e:
+            self.log.error(f"Error in scheduled job '{job.name}'", exc_info=e)
+        finally:
+            after = util.time_us()
+            job.runs += 1
+            job.last_run = before
+            job.last_duration_us = after - before
+            job.total_duration_us += job.last_duration_us
+            self.log.debug(f"Job '{job.name}' finished in {util.format_duration_us(job.last_duration_us)}")
+
+        if not job.cancelled:
+            self.push(job)
+
+    async def run(self):
+        while True:
+            now = time.time()
+
+            while self.queue and self.queue[0][0] <= now:
+                when, _, job = heapq.heappop(self.queue)
+                if job.cancelled or when != job.next_run:
+                    continue
+
+                self.bot.loop.create_task(self.run_job(job))
+
+            timeout = self.queue[0][0] - now if self.queue else None
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        # Jobs are restored as their modules load, so only orphans are left to handle here
+        self.prune_jobs()
+        self.wakeup = asyncio.Event()
+        self.task = self.bot.loop.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,66 @@
+import contextlib
+import json
+import time
+
+# Must not import anything heavy, since it is used to time the imports themselves
+
+# Async phases (e.g. "connect client") only record their end once the event loop gets back to them
+OVERLAP_NOTE = (
+    "Async phases that overlap others include time the event loop spent blocked on synchronous work, "
+    "such as module construction, so they overstate their own duration"
+)
+
+
+class Timeline:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases = []
+        self.total = None
+        self.recording = True
+
+    def record(self, name, start):
+        if self.recording:
+            self.phases.append((name, start - self.origin, time.perf_counter() - self.origin))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    async def measure(self, name, coro):
+        start = time.perf_counter()
+
+        try:
+            return await coro
+        finally:
+            self.record(name, start)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.origin
+        self.recording = False
+
+    def log(self, logger):
+        logger.info(f"Startup took {self.total * 1000:.1f} ms")
+        logger.info(f"Note: {OVERLAP_NOTE}")
+
+        # Phases may overlap, so show when each one started as well as how long it took
+        for name, start, end in sorted(self.phases, key=lambda p: p[1]):
+            logger.info(f"  {start * 1000:8.1f} ms  +{(end - start) * 1000:8.1f} ms  {name}")
+
+    def to_dict(self):
+        return {
+            "total_ms": self.total * 1000 if self.total is not None else None,
+            "note": OVERLAP_NOTE,
+            "phases": [
+                {"name": name, "start_ms": start * 1000, "duration_ms": (end - start) * 1000}
+                for name, start, end in self.phases
+            ],
+        }
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
@@ -15,6 +15,12 @@ def mention_user(user):
         return f"[{tg.utils.get_display_name(user)}](tg://user?id={user.id})"
 
 
+async def mention_user_ids(bot, user_ids):
+    # Served from the bot's entity cache, with all misses resolved in one batch
+    users = await bot.entities.resolve(user_ids)
+    return [mention_user(users[uid]) if uid in users else str(uid) for uid in user_ids]
+
+
 def time_us():
     return int(time.time() * 1000000)
 